@@ -2,6 +2,7 @@ import os
 import sys
 import asyncio
 import operator
+import re
 from typing import TypedDict, Annotated, Sequence
 import dotenv
 from pydantic import BaseModel, Field
@@ -38,6 +39,30 @@ if not FOGBUGZ_URL or not FOGBUGZ_TOKEN:
 # Initialize the client directly (no more subprocess server)
 fb_client = FogBugzClient(base_url=FOGBUGZ_URL or "", token=FOGBUGZ_TOKEN or "")
 
+# --- Retrieval Fast Path ---
+# When enabled, the graph searches the local index and prefetches the top-k
+# article bodies before the first LLM call, so many questions can be answered
+# in a single round trip. The tool loop remains available as the fallback.
+PREFETCH_ENABLED = os.getenv("DEEP_AGENT_PREFETCH", "false").lower() == "true"
+PREFETCH_TOP_K = max(0, int(os.getenv("DEEP_AGENT_PREFETCH_TOP_K", "3")))
+PREFETCH_MAX_CHARS = int(os.getenv("DEEP_AGENT_PREFETCH_MAX_CHARS", "6000"))
+
+# search_articles counts raw substring hits in titles, so filler words in a
+# natural-language question would match almost everything
+PREFETCH_STOPWORDS = {
+    "the", "and", "for", "are", "was", "were", "how", "what", "when", "where",
+    "which", "who", "why", "can", "could", "does", "did", "should", "would",
+    "will", "with", "from", "into", "about", "this", "that", "these", "those",
+    "there", "have", "has", "had", "you", "your", "our", "their", "them",
+    "they", "not", "any", "all", "get", "use", "using", "need", "want",
+    "please", "tell", "show", "explain", "find", "some", "way",
+}
+
+def prefetch_keywords(query: str) -> list:
+    """Reduce a natural-language question to search keywords."""
+    tokens = re.sub(r"[^\w\s]", " ", query.lower()).split()
+    return [t for t in tokens if len(t) >= 3 and t not in PREFETCH_STOPWORDS]
+
 # --- Define LangChain Tools ---
 # These tools wrap the underlying FogBugzClient methods
 
@@ -129,6 +154,59 @@ async def call_model(state: AgentState):
     response = await llm_with_tools.ainvoke(state["messages"])
     return {"messages": [response]}
 
+async def retrieve_context(state: AgentState):
+    """Prefetch the top-k matching articles and inject them as context."""
+    query = state["messages"][-1].content
+    keywords = prefetch_keywords(query)
+    if not keywords:
+        return {"messages": []}
+
+    try:
+        # FogBugzClient is synchronous; run it off the event loop
+        matches = await asyncio.to_thread(fb_client.search_articles, " ".join(keywords))
+    except Exception as e:
+        print(f"[Deep Agent Server] Prefetch search failed: {e}")
+        return {"messages": []}
+
+    # Only prefetch articles whose title matches at least half the keywords;
+    # anything weaker is left to the tool loop
+    top = [
+        art for art in matches
+        if 2 * sum(1 for k in keywords if k in art["title"].lower()) >= len(keywords)
+    ][:PREFETCH_TOP_K]
+    if not top:
+        return {"messages": []}
+
+    # Fetch article bodies concurrently; a failed fetch just drops that article
+    results = await asyncio.gather(
+        *(asyncio.to_thread(fb_client.view_article, art["article_id"]) for art in top),
+        return_exceptions=True,
+    )
+
+    sections = []
+    for art in results:
+        if isinstance(art, BaseException):
+            continue
+        content = art["content"]
+        if len(content) > PREFETCH_MAX_CHARS:
+            content = content[:PREFETCH_MAX_CHARS] + "\n\n[... truncated, use view_article for the full text]"
+        sections.append(f"### {art['title']} (article_id={art['article_id']})\n\n{content}")
+
+    if not sections:
+        return {"messages": []}
+
+    print(f"[Deep Agent Server] Prefetched {len(sections)} articles for context.")
+    # Attach the articles to the question as a user turn: a system message
+    # after the user's turn carries less weight with some deployments
+    context = (
+        "The following FogBugz articles were retrieved for my question. "
+        "Answer directly from them if they are sufficient; otherwise use the "
+        "available tools to search for and view other articles.\n\n"
+        + "\n\n---\n\n".join(sections)
+        + f"\n\n---\n\nQuestion: {query}"
+    )
+    return {"messages": [HumanMessage(content=context)]}
+
 async def call_tools(state: AgentState):
     last_message = state["messages"][-1]
     outputs = []
@@ -160,7 +238,12 @@ workflow = StateGraph(AgentState)
 workflow.add_node("agent", call_model)
 workflow.add_node("tools", call_tools)
 
-workflow.set_entry_point("agent")
+if PREFETCH_ENABLED and PREFETCH_TOP_K > 0:
+    workflow.add_node("retrieve", retrieve_context)
+    workflow.set_entry_point("retrieve")
+    workflow.add_edge("retrieve", "agent")
+else:
+    workflow.set_entry_point("agent")
 workflow.add_conditional_edges("agent", should_continue)
 workflow.add_edge("tools", "agent")
 